@@ -6,5 +6,6 @@ API Clients for multiple stock data sources
 from .yahoo_client import YahooFinanceClient
 from .alpha_vantage_client import AlphaVantageClient
 from .finnhub_client import FinnhubClient
+from .errors import ProviderError
 
-__all__ = ['YahooFinanceClient', 'AlphaVantageClient', 'FinnhubClient']
+__all__ = ['YahooFinanceClient', 'AlphaVantageClient', 'FinnhubClient', 'ProviderError']
@@ -4,11 +4,14 @@ Alpha Vantage API Client
 Free tier: 25 requests per day, 5 requests per minute
 """
 
-import requests
-import json
-import time
+import orjson
+import pandas as pd
 from datetime import datetime
 import logging
+from .errors import ProviderError
+from .http_session import create_session
+from utils.cache import ttl_cached, QUOTE_TTL_SECONDS, HISTORY_TTL_SECONDS
+from utils.ratelimit import TokenBucket
 
 class AlphaVantageClient:
     def __init__(self, api_key=None):
@@ -16,37 +19,55 @@ class AlphaVantageClient:
         self.api_key = api_key or 'demo'
         self.base_url = 'https://www.alphavantage.co/query'
         self.logger = logging.getLogger(__name__)
-        self.request_count = 0
-        self.last_request_time = 0
+        # 5 requests per minute, with the 25/day allowance as a separate bucket
+        self.bucket = TokenBucket(5, 5 / 60)
+        self.daily_bucket = TokenBucket(25, 25 / 86400)
+        self.session = create_session()
+        self.request_timeout = 10
+        
+    def close(self):
+        """Release pooled HTTP connections"""
+        self.session.close()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
     def _make_request(self, params):
-        """Make rate-limited request to Alpha Vantage API"""
-        # Rate limiting: max 5 requests per minute
-        current_time = time.time()
-        if current_time - self.last_request_time < 12:  # 12 seconds between requests
-            time.sleep(12 - (current_time - self.last_request_time))
+        """Make rate-limited request to Alpha Vantage API, raising ProviderError if it fails"""
+        # Skip rather than block once the daily quota is spent
+        if not self.daily_bucket.try_acquire():
+            raise ProviderError("Alpha Vantage daily request quota exhausted")
+        self.bucket.acquire()
             
         try:
-            response = requests.get(self.base_url, params=params, timeout=10)
-            self.last_request_time = time.time()
-            self.request_count += 1
+            response = self.session.get(self.base_url, params=params, timeout=self.request_timeout)
             
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return None
+            self.logger.debug(f"Alpha Vantage response: {len(response.content)} bytes, "
+                              f"encoding={response.headers.get('Content-Encoding', 'identity')}")
+            
+            if response.status_code != 200:
+                raise ProviderError(f"Alpha Vantage returned HTTP {response.status_code}")
                 
+            data = orjson.loads(response.content)
+            
+        except ProviderError:
+            raise
         except Exception as e:
-            self.logger.error(f"Alpha Vantage API request failed: {str(e)}")
-            return None
+            raise ProviderError(f"Alpha Vantage API request failed: {str(e)}") from e
+            
+        # Throttled requests still come back as 200 with a note instead of data
+        if isinstance(data, dict) and ('Note' in data or 'Information' in data):
+            raise ProviderError(f"Alpha Vantage rejected the request: {data.get('Note') or data.get('Information')}")
+            
+        return data
     
+    @ttl_cached(QUOTE_TTL_SECONDS)
     def get_stock_data(self, symbol):
         """Get current stock data from Alpha Vantage"""
         try:
-            # Skip if we've hit rate limits
-            if self.request_count >= 25:  # Daily limit
-                return None
-                
             params = {
                 'function': 'GLOBAL_QUOTE',
                 'symbol': symbol,
@@ -80,16 +101,61 @@ class AlphaVantageClient:
             
             return stock_data
             
+        except ProviderError as e:
+            # Let the caller count a failed request against the provider
+            self.logger.error(f"Error fetching Alpha Vantage data for {symbol}: {str(e)}")
+            raise
         except Exception as e:
             self.logger.error(f"Error fetching Alpha Vantage data for {symbol}: {str(e)}")
             return None
     
+    def get_stocks_batch(self, symbols, max_batch_size=100):
+        """Get current quotes for many symbols, up to 100 per request"""
+        results = {}
+        
+        for i in range(0, len(symbols), max_batch_size):
+            batch = symbols[i:i + max_batch_size]
+            
+            try:
+                params = {
+                    'function': 'REALTIME_BULK_QUOTES',
+                    'symbol': ','.join(batch),
+                    'apikey': self.api_key
+                }
+                
+                data = self._make_request(params)
+                
+                if not data or 'data' not in data:
+                    continue
+                    
+                for quote in data['data']:
+                    symbol = quote.get('symbol')
+                    if symbol not in batch or not quote.get('close'):
+                        continue
+                        
+                    results[symbol] = {
+                        'symbol': symbol,
+                        'price': float(quote.get('close', 0)),
+                        'change': float(quote.get('change') or 0),
+                        'change_percent': float(str(quote.get('change_percent') or '0').replace('%', '')),
+                        'volume': int(float(quote.get('volume') or 0)),
+                        'high': float(quote.get('high') or 0),
+                        'low': float(quote.get('low') or 0),
+                        'open': float(quote.get('open') or 0),
+                        'previous_close': float(quote.get('previous_close') or 0),
+                        'source': 'alpha_vantage',
+                        'timestamp': datetime.now().isoformat()
+                    }
+                    
+            except Exception as e:
+                self.logger.error(f"Error fetching Alpha Vantage bulk quotes starting at {batch[0]}: {str(e)}")
+                
+        return results
+    
+    @ttl_cached(HISTORY_TTL_SECONDS)
     def get_historical_data(self, symbol, outputsize='full'):
         """Get historical data from Alpha Vantage"""
         try:
-            if self.request_count >= 25:
-                return None
-                
             params = {
                 'function': 'TIME_SERIES_DAILY',
                 'symbol': symbol,
@@ -104,19 +170,27 @@ class AlphaVantageClient:
                 
             time_series = data['Time Series (Daily)']
             
-            historical_data = []
-            for date, values in time_series.items():
-                historical_data.append({
-                    'date': date,
-                    'open': float(values['1. open']),
-                    'high': float(values['2. high']),
-                    'low': float(values['3. low']),
-                    'close': float(values['4. close']),
-                    'volume': int(values['5. volume'])
-                })
+            historical_df = pd.DataFrame.from_dict(time_series, orient='index')
+            historical_df = historical_df.rename(columns={
+                '1. open': 'open',
+                '2. high': 'high',
+                '3. low': 'low',
+                '4. close': 'close',
+                '5. volume': 'volume'
+            })[['open', 'high', 'low', 'close', 'volume']].astype({
+                'open': 'float64',
+                'high': 'float64',
+                'low': 'float64',
+                'close': 'float64',
+                'volume': 'int64'
+            })
+            historical_df = historical_df.rename_axis('date').reset_index()
                 
-            # Sort by date (newest first)
-            historical_data.sort(key=lambda x: x['date'], reverse=True)
+            # The API lists days newest first and dict order is preserved, so the
+            # sort is only a fallback for responses that break that contract
+            if not historical_df['date'].is_monotonic_decreasing:
+                historical_df.sort_values('date', ascending=False, inplace=True)
+            historical_data = historical_df.to_dict('records')
             
             return historical_data
             
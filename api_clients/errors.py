@@ -0,0 +1,7 @@
+"""
+API Client Errors
+Lets callers tell a failed provider request apart from a symbol the provider doesn't know
+"""
+
+class ProviderError(Exception):
+    """A provider request failed (network error, bad status, or exhausted quota)"""
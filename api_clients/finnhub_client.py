@@ -4,11 +4,15 @@ Finnhub API Client
 Free tier: 60 API calls/minute
 """
 
-import requests
-import json
-import time
+import orjson
+import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
 import logging
+from .errors import ProviderError
+from .http_session import create_session
+from utils.cache import ttl_cached, QUOTE_TTL_SECONDS, HISTORY_TTL_SECONDS
+from utils.ratelimit import TokenBucket
 
 class FinnhubClient:
     def __init__(self, api_key=None):
@@ -16,41 +20,41 @@ class FinnhubClient:
         self.api_key = api_key or 'demo'
         self.base_url = 'https://finnhub.io/api/v1'
         self.logger = logging.getLogger(__name__)
-        self.request_count = 0
-        self.last_minute_start = time.time()
+        self.bucket = TokenBucket(60, 60 / 60)  # 60 requests per minute
+        self.session = create_session({'X-Finnhub-Token': self.api_key})
+        self.request_timeout = 10
+        
+    def close(self):
+        """Release pooled HTTP connections"""
+        self.session.close()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
     def _make_request(self, endpoint, params=None):
-        """Make rate-limited request to Finnhub API"""
-        # Rate limiting: max 60 requests per minute
-        current_time = time.time()
-        if current_time - self.last_minute_start >= 60:
-            self.request_count = 0
-            self.last_minute_start = current_time
-            
-        if self.request_count >= 60:
-            sleep_time = 60 - (current_time - self.last_minute_start)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-                self.request_count = 0
-                self.last_minute_start = time.time()
+        """Make rate-limited request to Finnhub API, raising ProviderError if it fails"""
+        self.bucket.acquire()
         
         try:
-            if params is None:
-                params = {}
-            params['token'] = self.api_key
+            response = self.session.get(f"{self.base_url}{endpoint}", params=params, timeout=self.request_timeout)
             
-            response = requests.get(f"{self.base_url}{endpoint}", params=params, timeout=10)
-            self.request_count += 1
+            self.logger.debug(f"Finnhub response: {len(response.content)} bytes, "
+                              f"encoding={response.headers.get('Content-Encoding', 'identity')}")
             
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return None
+            if response.status_code != 200:
+                raise ProviderError(f"Finnhub returned HTTP {response.status_code}")
                 
+            return orjson.loads(response.content)
+            
+        except ProviderError:
+            raise
         except Exception as e:
-            self.logger.error(f"Finnhub API request failed: {str(e)}")
-            return None
+            raise ProviderError(f"Finnhub API request failed: {str(e)}") from e
     
+    @ttl_cached(QUOTE_TTL_SECONDS)
     def get_stock_data(self, symbol):
         """Get current stock data from Finnhub"""
         try:
@@ -60,8 +64,12 @@ class FinnhubClient:
             if not quote_data or 'c' not in quote_data:
                 return None
                 
-            # Get company profile for additional info
-            profile_data = self._make_request('/stock/profile2', {'symbol': symbol})
+            # Get company profile for additional info; the quote stands without it
+            try:
+                profile_data = self._make_request('/stock/profile2', {'symbol': symbol})
+            except ProviderError as e:
+                self.logger.error(f"Error fetching Finnhub profile for {symbol}: {str(e)}")
+                profile_data = None
             
             stock_data = {
                 'symbol': symbol,
@@ -91,10 +99,15 @@ class FinnhubClient:
             
             return stock_data
             
+        except ProviderError as e:
+            # Let the caller count a failed request against the provider
+            self.logger.error(f"Error fetching Finnhub data for {symbol}: {str(e)}")
+            raise
         except Exception as e:
             self.logger.error(f"Error fetching Finnhub data for {symbol}: {str(e)}")
             return None
     
+    @ttl_cached(HISTORY_TTL_SECONDS)
     def get_historical_data(self, symbol, days=1825):  # 5 years
         """Get historical data from Finnhub"""
         try:
@@ -114,27 +127,19 @@ class FinnhubClient:
             if not data or data.get('s') != 'ok':
                 return None
                 
-            historical_data = []
-            timestamps = data.get('t', [])
-            opens = data.get('o', [])
-            highs = data.get('h', [])
-            lows = data.get('l', [])
-            closes = data.get('c', [])
-            volumes = data.get('v', [])
-            
-            for i in range(len(timestamps)):
-                date = datetime.fromtimestamp(timestamps[i]).strftime('%Y-%m-%d')
-                historical_data.append({
-                    'date': date,
-                    'open': float(opens[i]),
-                    'high': float(highs[i]),
-                    'low': float(lows[i]),
-                    'close': float(closes[i]),
-                    'volume': int(volumes[i])
-                })
+            # Candle arrays are column-oriented already; convert them in bulk
+            historical_df = pd.DataFrame({
+                'date': pd.to_datetime(np.asarray(data.get('t', []), dtype='int64'), unit='s').strftime('%Y-%m-%d'),
+                'open': np.asarray(data.get('o', []), dtype='float64'),
+                'high': np.asarray(data.get('h', []), dtype='float64'),
+                'low': np.asarray(data.get('l', []), dtype='float64'),
+                'close': np.asarray(data.get('c', []), dtype='float64'),
+                'volume': np.asarray(data.get('v', []), dtype='int64')
+            })
                 
-            # Sort by date (newest first)
-            historical_data.sort(key=lambda x: x['date'], reverse=True)
+            # Finnhub returns candles oldest first, so reversing gives newest first
+            # without a sort
+            historical_data = historical_df.iloc[::-1].to_dict('records')
             
             return historical_data
             
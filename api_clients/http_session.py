@@ -0,0 +1,40 @@
+"""
+Shared HTTP session factory
+Pooled, retrying requests.Session used by the REST API clients
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'geofm-dashboard/1.0'
+
+# urllib3 can only decode Brotli bodies when the brotli package is installed
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+def create_session(headers=None):
+    """Create a requests.Session with a keep-alive pool and retry policy"""
+    session = requests.Session()
+
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET']
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount('https://', adapter)
+
+    session.headers.update({
+        'Accept': 'application/json',
+        'Accept-Encoding': ACCEPT_ENCODING,
+        'User-Agent': USER_AGENT
+    })
+    if headers:
+        session.headers.update(headers)
+
+    return session
@@ -6,35 +6,78 @@ Free API for stock data with good coverage
 
 import yfinance as yf
 import pandas as pd
+import requests
 from datetime import datetime, timedelta
-import time
 import logging
+from utils.cache import ttl_cached, QUOTE_TTL_SECONDS, HISTORY_TTL_SECONDS
+from .errors import ProviderError
 
 class YahooFinanceClient:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
+    @ttl_cached(HISTORY_TTL_SECONDS)
+    def _get_profile(self, symbol):
+        """Get the full (slow) Yahoo info payload; descriptive fields rarely change"""
+        try:
+            return yf.Ticker(symbol).info or None
+        except requests.exceptions.RequestException as e:
+            raise ProviderError(f"Yahoo Finance request failed: {str(e)}") from e
+        except Exception as e:
+            self.logger.error(f"Error fetching profile for {symbol}: {str(e)}")
+            return None
+    
+    @ttl_cached(QUOTE_TTL_SECONDS)
     def get_stock_data(self, symbol):
         """Get current stock data from Yahoo Finance"""
         try:
             # Clean symbol format
             symbol = symbol.replace(':', '.')
             
+            # fast_info hits a single lightweight endpoint for the price fields
             ticker = yf.Ticker(symbol)
-            info = ticker.info
-            
-            if not info or 'regularMarketPrice' not in info:
-                return None
+            try:
+                fast_info = ticker.fast_info
+                price = fast_info.last_price
+                previous_close = fast_info.previous_close
+                volume = fast_info.last_volume
+                market_cap = fast_info.market_cap
+            except requests.exceptions.RequestException as e:
+                raise ProviderError(f"Yahoo Finance request failed: {str(e)}") from e
+            except Exception:
+                price = previous_close = volume = market_cap = None
+                
+            if price:
+                change = price - previous_close if previous_close else 0
+                change_percent = (change / previous_close) * 100 if previous_close else 0
+                
+                # Descriptive fields come from the slow info payload, which is cached
+                # for a day, so only the first quote per symbol waits on it
+                try:
+                    info = self._get_profile(symbol) or {}
+                except ProviderError as e:
+                    self.logger.error(f"Error fetching profile for {symbol}: {str(e)}")
+                    info = {}
+            else:
+                # Fall back to the full info payload when fast_info has no quote
+                info = self._get_profile(symbol) or {}
+                if 'regularMarketPrice' not in info:
+                    return None
+                    
+                price = info.get('regularMarketPrice', 0)
+                change = info.get('regularMarketChange', 0)
+                change_percent = info.get('regularMarketChangePercent', 0)
+                volume = info.get('regularMarketVolume', 0)
                 
             # Get current price and basic info
             stock_data = {
                 'symbol': symbol,
                 'name': info.get('longName', symbol),
-                'price': info.get('regularMarketPrice', 0),
-                'change': info.get('regularMarketChange', 0),
-                'change_percent': info.get('regularMarketChangePercent', 0),
-                'volume': info.get('regularMarketVolume', 0),
-                'market_cap': info.get('marketCap', 0),
+                'price': price,
+                'change': change,
+                'change_percent': change_percent,
+                'volume': volume or 0,
+                'market_cap': market_cap or info.get('marketCap', 0),
                 'pe_ratio': info.get('trailingPE', 0),
                 'dividend_yield': info.get('dividendYield', 0),
                 'sector': info.get('sector', 'Unknown'),
@@ -48,10 +91,15 @@ class YahooFinanceClient:
             
             return stock_data
             
+        except ProviderError as e:
+            # Let the caller count a failed request against the provider
+            self.logger.error(f"Error fetching data for {symbol}: {str(e)}")
+            raise
         except Exception as e:
             self.logger.error(f"Error fetching data for {symbol}: {str(e)}")
             return None
     
+    @ttl_cached(HISTORY_TTL_SECONDS)
     def get_historical_data(self, symbol, period='5y'):
         """Get historical data for a stock"""
         try:
@@ -83,19 +131,57 @@ class YahooFinanceClient:
             return None
     
     def get_multiple_stocks(self, symbols, max_batch_size=50):
-        """Get data for multiple stocks efficiently"""
+        """Get quote data for multiple stocks with one bulk download per batch"""
         results = {}
         
-        # Process in batches to avoid rate limits
         for i in range(0, len(symbols), max_batch_size):
             batch = symbols[i:i + max_batch_size]
+            yahoo_symbols = [symbol.replace(':', '.') for symbol in batch]
             
-            for symbol in batch:
-                stock_data = self.get_stock_data(symbol)
-                if stock_data:
-                    results[symbol] = stock_data
+            try:
+                # yfinance fetches the batch on its own thread pool
+                data = yf.download(yahoo_symbols, period='5d', group_by='ticker',
+                                   threads=True, progress=False)
+            except Exception as e:
+                self.logger.error(f"Error downloading batch starting at {batch[0]}: {str(e)}")
+                continue
+                
+            if data is None or data.empty:
+                continue
+                
+            for symbol, yahoo_symbol in zip(batch, yahoo_symbols):
+                try:
+                    if isinstance(data.columns, pd.MultiIndex):
+                        if yahoo_symbol not in data.columns.get_level_values(0):
+                            continue
+                        frame = data[yahoo_symbol]
+                    else:
+                        frame = data
+                        
+                    frame = frame.dropna(subset=['Close'])
+                    if frame.empty:
+                        continue
+                        
+                    # Volume/High/Low/Open can be NaN on the latest bar
+                    last = frame.iloc[-1].fillna(0)
+                    price = float(last['Close'])
+                    previous_close = float(frame['Close'].iloc[-2]) if len(frame) > 1 else price
+                    change = price - previous_close
                     
-                # Small delay to respect rate limits
-                time.sleep(0.1)
+                    results[symbol] = {
+                        'symbol': yahoo_symbol,
+                        'price': price,
+                        'change': change,
+                        'change_percent': (change / previous_close) * 100 if previous_close else 0,
+                        'volume': int(last['Volume']),
+                        'high': float(last['High']),
+                        'low': float(last['Low']),
+                        'open': float(last['Open']),
+                        'previous_close': previous_close,
+                        'source': 'yahoo_finance',
+                        'timestamp': datetime.now().isoformat()
+                    }
+                except Exception as e:
+                    self.logger.error(f"Error parsing bulk quote for {symbol}: {str(e)}")
                 
         return results
@@ -5,11 +5,17 @@ Comprehensive stock tracking with multiple APIs, 5-year history, and PDF export
 """
 
 import os
+import hmac
 import json
+import orjson
 import pandas as pd
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 from flask import Flask, render_template, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 import plotly.graph_objs as go
 import plotly.utils
 from api_clients.yahoo_client import YahooFinanceClient
@@ -18,9 +24,26 @@ from api_clients.finnhub_client import FinnhubClient
 from utils.data_processor import DataProcessor
 from utils.pdf_exporter import PDFExporter
 from utils.database_manager import DatabaseManager
+from utils.ratelimit import CircuitBreaker
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for faster API responses"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'geospatial-portfolio-dashboard-2024'
+app.json = ORJSONProvider(app)
+# Token for admin endpoints; without one they only answer local requests
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
 
 # Initialize components
 db_manager = DatabaseManager()
@@ -32,6 +55,92 @@ yahoo_client = YahooFinanceClient()
 alpha_vantage_client = AlphaVantageClient()
 finnhub_client = FinnhubClient()
 
+# Providers in priority order, each with its own circuit breaker
+stock_providers = [
+    (yahoo_client, CircuitBreaker()),
+    (alpha_vantage_client, CircuitBreaker()),
+    (finnhub_client, CircuitBreaker())
+]
+provider_executor = ThreadPoolExecutor(max_workers=12)
+PROVIDER_STAGGER_SECONDS = 1.5  # head start given to each higher-priority provider
+PROVIDER_TIMEOUT_SECONDS = 8
+
+_outcome_lock = threading.Lock()
+
+def _record_outcome(future, breaker, failed):
+    """Report a lookup to its provider's breaker exactly once"""
+    with _outcome_lock:
+        if getattr(future, 'outcome_recorded', False):
+            return
+        future.outcome_recorded = True
+        
+    if failed:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+def _submit_lookup(client, breaker, symbol):
+    """Start a provider lookup whose outcome feeds its circuit breaker when it finishes.
+    
+    Only errors (the clients raise ProviderError when a request fails) count as
+    failures; None (symbol not found) means the provider is healthy. Time spent
+    waiting on the client's own rate limiter is not held against it.
+    """
+    future = provider_executor.submit(client.get_stock_data, symbol)
+    
+    def on_done(f):
+        if f.cancelled():
+            return
+        _record_outcome(f, breaker, f.exception() is not None)
+        
+    future.add_done_callback(on_done)
+    return future
+
+def _first_result(pending, timeout):
+    """Wait up to timeout for the first pending lookup that returns data"""
+    deadline = time.monotonic() + timeout
+    while pending:
+        done, _ = wait(pending, timeout=max(0, deadline - time.monotonic()),
+                       return_when=FIRST_COMPLETED)
+        if not done:
+            return None
+            
+        for future in done:
+            pending.pop(future)
+            result = future.result() if future.exception() is None else None
+            if result:
+                return result
+            
+    return None
+
+def fetch_stock_data(symbol):
+    """Race the data providers, starting each one only if the previous is slow or fails"""
+    deadline = time.monotonic() + PROVIDER_TIMEOUT_SECONDS
+    pending = {}
+    
+    try:
+        for client, breaker in stock_providers:
+            if not breaker.allow():
+                continue
+                
+            pending[_submit_lookup(client, breaker, symbol)] = (client, breaker)
+            result = _first_result(pending, min(PROVIDER_STAGGER_SECONDS, max(0, deadline - time.monotonic())))
+            if result:
+                return result
+                
+        return _first_result(pending, max(0, deadline - time.monotonic()))
+    finally:
+        timed_out = time.monotonic() >= deadline
+        for future, (client, breaker) in pending.items():
+            # A provider with no request timeout of its own (yfinance) may never return,
+            # so count it as failed at the deadline; its done callback then won't count
+            # it again. The others raise once their HTTP timeout expires.
+            if timed_out and not future.done() and getattr(client, 'request_timeout', None) is None:
+                _record_outcome(future, breaker, True)
+                
+            # Lookups already running finish in the background and warm the client caches
+            future.cancel()
+
 @app.route('/')
 def dashboard():
     """Main dashboard page"""
@@ -56,25 +165,19 @@ def get_stock_detail(symbol):
     """Get detailed data for a specific stock"""
     try:
         # Try multiple APIs for better coverage
-        stock_data = None
-        
-        # Try Yahoo Finance first
-        stock_data = yahoo_client.get_stock_data(symbol)
-        if not stock_data:
-            # Try Alpha Vantage
-            stock_data = alpha_vantage_client.get_stock_data(symbol)
-        if not stock_data:
-            # Try Finnhub
-            stock_data = finnhub_client.get_stock_data(symbol)
+        stock_data = fetch_stock_data(symbol)
             
         if stock_data:
+            # Store the quote in database before history is attached
+            db_manager.store_stock_data(symbol, stock_data)
+            
+            # Quotes are shared through the client caches, so work on a copy
+            stock_data = dict(stock_data)
+            
             # Get 5-year historical data
             historical_data = data_processor.get_historical_data(symbol, years=5)
             stock_data['historical'] = historical_data
             
-            # Store in database
-            db_manager.store_stock_data(symbol, stock_data)
-            
             return jsonify({
                 'success': True,
                 'data': stock_data,
@@ -119,11 +222,12 @@ def export_pdf():
         # Get all necessary data
         stocks_data = data_processor.get_enhanced_stocks_data()
         performance_data = data_processor.calculate_portfolio_performance()
-        sector_data = data_processor.get_sector_analysis()
+        sector_data = data_processor.get_sector_aggregates()
+        top_performers = data_processor.get_top_performers(10)
         
         # Generate PDF
         pdf_path = pdf_exporter.generate_portfolio_report(
-            stocks_data, performance_data, sector_data
+            stocks_data, performance_data, sector_data, top_performers
         )
         
         return send_file(pdf_path, as_attachment=True, 
@@ -135,7 +239,9 @@ def export_pdf():
 def update_all_stocks():
     """Update all stock data - background process"""
     try:
-        result = data_processor.update_all_stocks_data()
+        result = data_processor.update_all_stocks_data(yahoo_client, alpha_vantage_client)
+        db_manager.store_stock_data_bulk(result.get('stocks', {}))
+        
         return jsonify({
             'success': True,
             'message': 'Stock data update initiated',
@@ -145,6 +251,33 @@ def update_all_stocks():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _is_admin_request():
+    """Check the X-Admin-Token header, or allow only local requests when no token is configured"""
+    token = app.config.get('ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Clear cached data files, derived analytics and API lookups"""
+    if not _is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+        
+    try:
+        data_processor.invalidate_caches()
+        for client in (yahoo_client, alpha_vantage_client, finnhub_client):
+            client.get_stock_data.cache_clear()
+            client.get_historical_data.cache_clear()
+            
+        return jsonify({
+            'success': True,
+            'message': 'Caches cleared',
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/trades')
 def get_trades_data():
     """Get trading history data"""
@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration for production deployments
+gevent workers let the blocking API clients yield while waiting on sockets
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+
+# The gevent worker monkey-patches the standard library before loading the app,
+# so requests/yfinance socket reads become cooperative without code changes
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = 60
+
+def on_starting(server):
+    """Create database tables once in the master before workers fork"""
+    from utils.database_manager import DatabaseManager
+    db_manager = DatabaseManager()
+    try:
+        db_manager.initialize_database()
+    finally:
+        # Don't carry an open SQLite connection across the worker fork
+        db_manager.close()
@@ -6,5 +6,7 @@ Utility modules for the Enhanced Geospatial Portfolio Dashboard
 from .data_processor import DataProcessor
 from .pdf_exporter import PDFExporter
 from .database_manager import DatabaseManager
+from .cache import TTLCache, ttl_cached
+from .ratelimit import TokenBucket, CircuitBreaker
 
-__all__ = ['DataProcessor', 'PDFExporter', 'DatabaseManager']
+__all__ = ['DataProcessor', 'PDFExporter', 'DatabaseManager', 'TTLCache', 'ttl_cached', 'TokenBucket', 'CircuitBreaker']
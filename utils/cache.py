@@ -0,0 +1,115 @@
+"""
+In-memory TTL Caching
+Time-bounded memoization for API lookups with in-flight request coalescing
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+QUOTE_TTL_SECONDS = 60
+HISTORY_TTL_SECONDS = 24 * 60 * 60
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl_seconds"""
+
+    def __init__(self, ttl_seconds, maxsize=1024):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+def ttl_cached(ttl_seconds, maxsize=1024):
+    """Memoize a function's non-None results for ttl_seconds.
+
+    Concurrent calls with the same arguments share a single in-flight
+    computation instead of each issuing their own network request.
+    """
+    def decorator(func):
+        cache = TTLCache(ttl_seconds, maxsize)
+        in_flight = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, frozenset(kwargs.items()))
+
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            with lock:
+                value = cache.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+
+                future = in_flight.get(key)
+                is_owner = future is None
+                if is_owner:
+                    future = Future()
+                    in_flight[key] = future
+
+            if not is_owner:
+                return future.result()
+
+            try:
+                value = func(*args, **kwargs)
+                # Failed lookups return None; don't pin them so fallbacks can retry
+                if value is not None:
+                    cache.set(key, value)
+                future.set_result(value)
+                return value
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with lock:
+                    in_flight.pop(key, None)
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
@@ -4,24 +4,113 @@ Data Processing Utilities
 Handles stock data processing, analysis, and portfolio calculations
 """
 
-import json
+import orjson
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import logging
 from typing import Dict, List, Any
 import os
+from .cache import TTLCache, HISTORY_TTL_SECONDS
+from .numeric import random_walk
+
+STOCKS_FILE = 'enhanced_stocks_for_dashboard.json'
+PRIORITY_STOCKS_FILE = 'api_priority_stocks.json'
+TRADES_FILE = 'all_trades_raw_data.csv'
+
+# Explicit column types for the trades export so read_csv skips type inference
+TRADES_DTYPES = {
+    'Code': str,
+    'Market Code': str,
+    'Name': str,
+    'Date': str,
+    'Type': str,
+    'Qty': 'float64',
+    'Price': 'float64',
+    'Instrument Currency': str,
+    'Cost Base Per Share (aud)': 'float64',
+    'Brokerage': 'float64',
+    'Brokerage Currency': str,
+    'Exch. Rate': 'float64',
+    'Value': 'float64',
+    'Unnamed_13': 'float64'
+}
+
+# Market cap bucket upper bounds and their labels, smallest first
+CAP_BOUNDARIES = np.array([300_000_000, 2_000_000_000, 10_000_000_000, 200_000_000_000], dtype='float64')
+CAP_LABELS = np.array(['Micro Cap', 'Small Cap', 'Mid Cap', 'Large Cap', 'Mega Cap'])
+
+def _read_json(path):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def _read_trades_csv(path):
+    return pd.read_csv(path, dtype=TRADES_DTYPES)
+
+def _format_date(value):
+    return None if pd.isna(value) else value.strftime('%Y-%m-%d')
 
 class DataProcessor:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.data_dir = 'data'
+        self._file_cache = {}
+        self._stocks_df = None
+        self._stocks_records = []
+        self._stocks_df_mtime = None
+        self._results_cache = {}
+        self._trade_dates = None
+        self._historical_cache = TTLCache(HISTORY_TTL_SECONDS, maxsize=256)
         
+    def _file_mtimes(self, *filenames):
+        """Modification times of data files, None for any that are missing"""
+        mtimes = []
+        for filename in filenames:
+            try:
+                mtimes.append(os.path.getmtime(f'{self.data_dir}/{filename}'))
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+    
+    def _memoize(self, name, filenames, compute):
+        """Return compute()'s cached result while the input files are unchanged"""
+        key = self._file_mtimes(*filenames)
+        
+        cached = self._results_cache.get(name)
+        if cached is not None and None not in key and cached[0] == key:
+            return cached[1]
+            
+        result = compute()
+        self._results_cache[name] = (key, result)
+        return result
+    
+    def invalidate_caches(self):
+        """Drop all cached file contents and derived results"""
+        self._file_cache.clear()
+        self._results_cache.clear()
+        self._stocks_df = None
+        self._stocks_records = []
+        self._stocks_df_mtime = None
+        self._trade_dates = None
+        self._historical_cache.clear()
+        
+    def _load_cached(self, filename, loader):
+        """Load a data file, reusing the parsed result until its mtime changes"""
+        path = f'{self.data_dir}/{filename}'
+        mtime = os.path.getmtime(path)
+        
+        cached = self._file_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+            
+        data = loader(path)
+        self._file_cache[path] = (mtime, data)
+        return data
+    
     def load_enhanced_stocks(self):
         """Load enhanced stocks data from JSON file"""
         try:
-            with open(f'{self.data_dir}/enhanced_stocks_for_dashboard.json', 'r') as f:
-                return json.load(f)
+            return self._load_cached(STOCKS_FILE, _read_json)
         except Exception as e:
             self.logger.error(f"Error loading enhanced stocks: {str(e)}")
             return []
@@ -29,8 +118,7 @@ class DataProcessor:
     def load_priority_stocks(self):
         """Load priority stocks for API calls"""
         try:
-            with open(f'{self.data_dir}/api_priority_stocks.json', 'r') as f:
-                return json.load(f)
+            return self._load_cached(PRIORITY_STOCKS_FILE, _read_json)
         except Exception as e:
             self.logger.error(f"Error loading priority stocks: {str(e)}")
             return []
@@ -38,105 +126,144 @@ class DataProcessor:
     def load_trades_data(self):
         """Load trading history data"""
         try:
-            return pd.read_csv(f'{self.data_dir}/all_trades_raw_data.csv')
+            return self._load_cached(TRADES_FILE, _read_trades_csv)
         except Exception as e:
             self.logger.error(f"Error loading trades data: {str(e)}")
             return pd.DataFrame()
     
     def get_enhanced_stocks_data(self):
         """Get processed stocks data with enhanced information"""
-        stocks = self.load_enhanced_stocks()
-        
-        # Add calculated fields
-        for stock in stocks:
-            # Calculate market cap category
-            market_cap = stock.get('market_cap', 0)
-            if market_cap > 200_000_000_000:
-                stock['cap_category'] = 'Mega Cap'
-            elif market_cap > 10_000_000_000:
-                stock['cap_category'] = 'Large Cap'
-            elif market_cap > 2_000_000_000:
-                stock['cap_category'] = 'Mid Cap'
-            elif market_cap > 300_000_000:
-                stock['cap_category'] = 'Small Cap'
-            else:
-                stock['cap_category'] = 'Micro Cap'
-                
-            # Calculate performance metrics
-            price = stock.get('price', 0)
-            change = stock.get('change', 0)
-            if price > 0:
-                stock['change_percent'] = (change / (price - change)) * 100
-            else:
-                stock['change_percent'] = 0
+        # Copy so calculated fields don't leak into the cached file contents
+        stocks = [dict(stock) for stock in self.load_enhanced_stocks()]
+        
+        # Calculate market cap category; a cap equal to a boundary falls in the lower bucket
+        market_caps = np.array([stock.get('market_cap') or 0 for stock in stocks], dtype='float64')
+        cap_categories = CAP_LABELS[np.searchsorted(CAP_BOUNDARIES, market_caps, side='left')]
+        
+        # Calculate performance metrics
+        prices = np.array([stock.get('price') or 0 for stock in stocks], dtype='float64')
+        changes = np.array([stock.get('change') or 0 for stock in stocks], dtype='float64')
+        previous_closes = prices - changes
+        change_percents = np.divide(
+            changes, previous_closes,
+            out=np.zeros_like(changes),
+            where=(prices > 0) & (previous_closes != 0)
+        ) * 100
+        
+        for stock, cap_category, change_percent in zip(stocks, cap_categories.tolist(), change_percents.tolist()):
+            stock['cap_category'] = cap_category
+            stock['change_percent'] = change_percent
                 
         return stocks
     
+    def _get_stocks_frame(self):
+        """Get enhanced stocks as a DataFrame, rebuilt only when the JSON file changes"""
+        mtime, = self._file_mtimes(STOCKS_FILE)
+            
+        if self._stocks_df is None or mtime is None or mtime != self._stocks_df_mtime:
+            stocks = self.get_enhanced_stocks_data()
+            stocks_df = pd.DataFrame(stocks)
+            
+            # Normalize the columns the aggregations rely on
+            stocks_df['sector'] = stocks_df['sector'].fillna('Unknown') if 'sector' in stocks_df.columns else 'Unknown'
+            stocks_df['name'] = stocks_df['name'].fillna('N/A') if 'name' in stocks_df.columns else 'N/A'
+            for col in ['market_cap', 'change', 'price']:
+                if col in stocks_df.columns:
+                    stocks_df[col] = pd.to_numeric(stocks_df[col], errors='coerce').fillna(0)
+                else:
+                    stocks_df[col] = 0.0
+                
+            self._stocks_records = stocks
+            self._stocks_df = stocks_df
+            self._stocks_df_mtime = mtime
+            
+        return self._stocks_df
+    
     def get_sector_analysis(self):
         """Analyze stocks by sector"""
-        stocks = self.get_enhanced_stocks_data()
-        
-        sector_data = {}
-        for stock in stocks:
-            sector = stock.get('sector', 'Unknown')
-            if sector not in sector_data:
-                sector_data[sector] = {
-                    'count': 0,
-                    'total_market_cap': 0,
-                    'avg_price': 0,
-                    'total_change': 0,
-                    'stocks': []
-                }
-            
-            sector_data[sector]['count'] += 1
-            sector_data[sector]['total_market_cap'] += stock.get('market_cap', 0)
-            sector_data[sector]['total_change'] += stock.get('change', 0)
-            sector_data[sector]['stocks'].append(stock)
-        
-        # Calculate averages
-        for sector, data in sector_data.items():
-            if data['count'] > 0:
-                data['avg_market_cap'] = data['total_market_cap'] / data['count']
-                data['avg_change'] = data['total_change'] / data['count']
-                data['avg_price'] = sum(s.get('price', 0) for s in data['stocks']) / data['count']
+        return self._memoize('sector_analysis', [STOCKS_FILE], self._compute_sector_analysis)
+    
+    def _compute_sector_analysis(self):
+        stocks_df = self._get_stocks_frame()
+        stocks = self._stocks_records
+        
+        if stocks_df.empty:
+            return {}
+        
+        grouped = stocks_df.groupby('sector', sort=False)
+        sector_df = grouped.agg(
+            count=('sector', 'size'),
+            total_market_cap=('market_cap', 'sum'),
+            avg_price=('price', 'mean'),
+            total_change=('change', 'sum'),
+            avg_market_cap=('market_cap', 'mean'),
+            avg_change=('change', 'mean')
+        )
+        
+        sector_data = sector_df.to_dict('index')
+        for sector, positions in grouped.indices.items():
+            sector_data[sector]['stocks'] = [stocks[i] for i in positions]
         
         return sector_data
     
+    def get_sector_aggregates(self):
+        """Per-sector count and averages as a small DataFrame, one row per sector"""
+        return self._memoize('sector_aggregates', [STOCKS_FILE], self._compute_sector_aggregates)
+    
+    def _compute_sector_aggregates(self):
+        stocks_df = self._get_stocks_frame()
+        
+        return stocks_df.groupby('sector', sort=False).agg(
+            count=('sector', 'size'),
+            avg_market_cap=('market_cap', 'mean'),
+            avg_change=('change', 'mean')
+        ).reset_index()
+    
+    def get_top_performers(self, n=10):
+        """Top n stocks by change as a DataFrame"""
+        return self._memoize(f'top_performers_{n}', [STOCKS_FILE],
+                             lambda: self._compute_top_performers(n))
+    
+    def _compute_top_performers(self, n):
+        stocks_df = self._get_stocks_frame()
+        columns = [col for col in ['symbol', 'name', 'price', 'change', 'sector'] if col in stocks_df.columns]
+        
+        return stocks_df.nlargest(n, 'change')[columns].reset_index(drop=True)
+    
     def calculate_portfolio_performance(self):
         """Calculate overall portfolio performance metrics"""
-        stocks = self.get_enhanced_stocks_data()
+        return self._memoize('portfolio_performance', [STOCKS_FILE, TRADES_FILE],
+                             self._compute_portfolio_performance)
+    
+    def _compute_portfolio_performance(self):
+        stocks_df = self._get_stocks_frame()
         trades_df = self.load_trades_data()
         
-        if not stocks:
+        if stocks_df.empty:
             return {}
         
-        total_stocks = len(stocks)
-        total_market_cap = sum(s.get('market_cap', 0) for s in stocks)
-        total_change = sum(s.get('change', 0) for s in stocks)
-        avg_change = total_change / total_stocks if total_stocks > 0 else 0
+        total_stocks = len(stocks_df)
+        total_market_cap = float(stocks_df['market_cap'].sum())
+        avg_change = float(stocks_df['change'].mean())
         
         # Performance by sector
-        sector_performance = {}
-        for stock in stocks:
-            sector = stock.get('sector', 'Unknown')
-            if sector not in sector_performance:
-                sector_performance[sector] = {'count': 0, 'total_change': 0}
-            sector_performance[sector]['count'] += 1
-            sector_performance[sector]['total_change'] += stock.get('change', 0)
-        
-        for sector, data in sector_performance.items():
-            data['avg_change'] = data['total_change'] / data['count'] if data['count'] > 0 else 0
+        sector_performance = stocks_df.groupby('sector', sort=False).agg(
+            count=('sector', 'size'),
+            total_change=('change', 'sum'),
+            avg_change=('change', 'mean')
+        ).to_dict('index')
         
         # Trading analysis
         trading_stats = {}
         if not trades_df.empty:
+            trade_dates = self._get_trade_dates(trades_df) if 'Date' in trades_df.columns else None
             trading_stats = {
                 'total_trades': len(trades_df),
                 'total_volume': trades_df['Volume'].sum() if 'Volume' in trades_df.columns else 0,
                 'avg_trade_size': trades_df['Volume'].mean() if 'Volume' in trades_df.columns else 0,
                 'date_range': {
-                    'start': trades_df['Date'].min() if 'Date' in trades_df.columns else None,
-                    'end': trades_df['Date'].max() if 'Date' in trades_df.columns else None
+                    'start': _format_date(trade_dates.min()) if trade_dates is not None else None,
+                    'end': _format_date(trade_dates.max()) if trade_dates is not None else None
                 }
             }
         
@@ -149,35 +276,46 @@ class DataProcessor:
             'last_updated': datetime.now().isoformat()
         }
     
+    def _get_trade_dates(self, trades_df):
+        """Parse the trades Date column once per loaded trades file"""
+        if self._trade_dates is None or self._trade_dates[0] is not trades_df:
+            self._trade_dates = (trades_df, pd.to_datetime(trades_df['Date'], errors='coerce', cache=True))
+        return self._trade_dates[1]
+    
     def get_historical_data(self, symbol, years=5):
         """Get or generate historical data for a stock"""
         # This would typically fetch from database or API
-        # For now, return sample structure
+        # For now, return sample structure, generated once per symbol per day
+        key = (symbol, years)
+        historical_data = self._historical_cache.get(key)
+        if historical_data is None:
+            historical_data = self._generate_historical_data(years)
+            self._historical_cache.set(key, historical_data)
+        return historical_data
+    
+    def _generate_historical_data(self, years):
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=years*365)
+        n_days = years * 365 + 1  # inclusive of both endpoints
         
-        # Generate sample historical data structure
-        historical_data = []
-        current_date = start_date
-        base_price = 100  # Sample base price
+        # Simple random walk for demo, floored at 1 on every step to keep prices positive
+        deltas = np.random.normal(0, 2, n_days)
+        prices = random_walk(deltas, 100.0, 1.0)
+        volumes = np.random.randint(100000, 1000000, n_days)
+        dates = pd.date_range(end=end_date, periods=n_days, freq='D')
         
-        while current_date <= end_date:
-            # Simple random walk for demo
-            change = np.random.normal(0, 2)
-            base_price = max(base_price + change, 1)  # Ensure positive price
-            
-            historical_data.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'close': round(base_price, 2),
-                'volume': np.random.randint(100000, 1000000)
-            })
-            
-            current_date += timedelta(days=1)
+        historical_df = pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'),
+            'close': prices.round(2),
+            'volume': volumes
+        })
         
-        return historical_data
+        return historical_df.to_dict('records')
     
     def get_trades_analysis(self):
         """Analyze trading data"""
+        return self._memoize('trades_analysis', [TRADES_FILE], self._compute_trades_analysis)
+    
+    def _compute_trades_analysis(self):
         trades_df = self.load_trades_data()
         
         if trades_df.empty:
@@ -192,31 +330,40 @@ class DataProcessor:
         
         # Date analysis
         if 'Date' in trades_df.columns:
+            trade_dates = self._get_trade_dates(trades_df)
             analysis['date_range'] = {
-                'start': str(trades_df['Date'].min()),
-                'end': str(trades_df['Date'].max())
+                'start': _format_date(trade_dates.min()),
+                'end': _format_date(trade_dates.max())
             }
         
-        # Numeric columns analysis
-        numeric_columns = trades_df.select_dtypes(include=[np.number]).columns
-        for col in numeric_columns:
-            analysis['summary_stats'][col] = {
-                'mean': float(trades_df[col].mean()),
-                'median': float(trades_df[col].median()),
-                'std': float(trades_df[col].std()),
-                'min': float(trades_df[col].min()),
-                'max': float(trades_df[col].max())
-            }
+        # Numeric columns analysis, all statistics from one describe() call
+        numeric_df = trades_df.select_dtypes(include=[np.number])
+        if not numeric_df.columns.empty:
+            summary_df = numeric_df.describe().T[['mean', '50%', 'std', 'min', 'max']]
+            summary_df = summary_df.rename(columns={'50%': 'median'}).astype('float64')
+            analysis['summary_stats'] = summary_df.to_dict('index')
         
         return analysis
     
-    def update_all_stocks_data(self):
-        """Update all stocks data using multiple APIs"""
-        # This would be implemented to update all stocks
-        # For now, return a sample response
+    def update_all_stocks_data(self, yahoo_client, alpha_vantage_client=None):
+        """Update all stocks data using the batch endpoints of the APIs"""
+        stocks = self.load_priority_stocks()
+        symbols = [stock.get('ticker_for_api') or stock.get('symbol') for stock in stocks]
+        symbols = [symbol for symbol in symbols if symbol]
+        
+        # One bulk download per batch from Yahoo, then Alpha Vantage bulk quotes for the gaps
+        results = yahoo_client.get_multiple_stocks(symbols)
+        missing = [symbol for symbol in symbols if symbol not in results]
+        if missing and alpha_vantage_client is not None:
+            results.update(alpha_vantage_client.get_stocks_batch(missing))
+            
+        self.invalidate_caches()
+        
+        updated_count = len(results)
         return {
-            'updated_count': 130,
-            'failed_count': 0,
-            'success_rate': 100.0,
+            'updated_count': updated_count,
+            'failed_count': len(symbols) - updated_count,
+            'success_rate': round(updated_count / len(symbols) * 100, 1) if symbols else 0.0,
+            'stocks': results,
             'timestamp': datetime.now().isoformat()
         }
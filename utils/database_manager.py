@@ -5,11 +5,172 @@ SQLite database for storing historical data and performance tracking
 """
 
 import sqlite3
-import json
+import orjson
+import threading
+import time
+import atexit
+import weakref
+from collections import deque
+from contextlib import contextmanager
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import os
+import re
+
+# Parquet side store for price history; SQLite is used alone without pyarrow
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Cross-process file locks for the Parquet files (POSIX only)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+HISTORY_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+# Applied to every connection: WAL lets readers and the writer run concurrently,
+# and synchronous=NORMAL is durable under WAL without an fsync per commit.
+# recursive_triggers makes INSERT OR REPLACE fire DELETE triggers for replaced rows.
+CONNECTION_PRAGMAS = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA recursive_triggers=ON;
+'''
+
+# Tables whose row counts are kept in row_counts by triggers. trades is bulk
+# replaced by import_trades_data, which records its count directly.
+COUNTED_TABLES = ['stocks', 'stock_prices', 'portfolio_snapshots', 'api_usage']
+
+# Stock prices table (historical data), clustered by (symbol, date)
+STOCK_PRICES_SQL = '''
+    CREATE TABLE IF NOT EXISTS stock_prices (
+        symbol TEXT NOT NULL,
+        date DATE NOT NULL,
+        open_price REAL,
+        high_price REAL,
+        low_price REAL,
+        close_price REAL,
+        volume INTEGER,
+        source TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(symbol, date)
+    ) WITHOUT ROWID
+'''
+
+# Seed a table's counter once, then keep it current with triggers
+ROW_COUNT_SQL = '''
+    INSERT INTO row_counts (table_name, n)
+    SELECT '{table}', (SELECT COUNT(*) FROM {table})
+    WHERE NOT EXISTS (SELECT 1 FROM row_counts WHERE table_name = '{table}');
+'''
+
+ROW_COUNT_TRIGGERS_SQL = '''
+    CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+    BEGIN
+        UPDATE row_counts SET n = n + 1 WHERE table_name = '{table}';
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+    BEGIN
+        UPDATE row_counts SET n = n - 1 WHERE table_name = '{table}';
+    END;
+'''
+
+# Stocks table: the provider payload is kept as JSON in data, and the fields we
+# query are virtual columns extracted on read, so new fields need no ALTER TABLE
+STOCKS_SQL = '''
+    CREATE TABLE IF NOT EXISTS stocks (
+        id INTEGER PRIMARY KEY,
+        symbol TEXT UNIQUE NOT NULL,
+        data TEXT,
+        name TEXT GENERATED ALWAYS AS (json_extract(data, '$.name')) VIRTUAL,
+        sector TEXT GENERATED ALWAYS AS (json_extract(data, '$.sector')) VIRTUAL,
+        industry TEXT GENERATED ALWAYS AS (json_extract(data, '$.industry')) VIRTUAL,
+        country TEXT GENERATED ALWAYS AS (json_extract(data, '$.country')) VIRTUAL,
+        exchange TEXT GENERATED ALWAYS AS (json_extract(data, '$.exchange')) VIRTUAL,
+        currency TEXT GENERATED ALWAYS AS (coalesce(json_extract(data, '$.currency'), 'USD')) VIRTUAL,
+        price REAL GENERATED ALWAYS AS (json_extract(data, '$.price')) VIRTUAL,
+        market_cap REAL GENERATED ALWAYS AS (json_extract(data, '$.market_cap')) VIRTUAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+SCHEMA_SQL = STOCKS_SQL + ''';
+    
+    CREATE INDEX IF NOT EXISTS idx_stocks_price ON stocks(price);
+''' + STOCK_PRICES_SQL + ''';
+    
+    -- Portfolio performance tracking
+    CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+        id INTEGER PRIMARY KEY,
+        snapshot_date DATE NOT NULL,
+        total_stocks INTEGER,
+        total_market_cap REAL,
+        avg_change REAL,
+        success_rate REAL,
+        data_coverage_percent REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    -- API usage tracking
+    CREATE TABLE IF NOT EXISTS api_usage (
+        id INTEGER PRIMARY KEY,
+        api_source TEXT NOT NULL,
+        symbol TEXT,
+        request_date DATE NOT NULL,
+        success BOOLEAN,
+        response_time REAL,
+        error_message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    -- Trading data
+    CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY,
+        symbol TEXT,
+        trade_date DATE,
+        trade_type TEXT,
+        quantity INTEGER,
+        price REAL,
+        volume INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    -- Indexes for the hot query paths. stock_prices lookups by symbol
+    -- and date are already served by its (symbol, date) primary key.
+    CREATE INDEX IF NOT EXISTS idx_api_usage_date_source ON api_usage(request_date, api_source);
+    
+    -- MIN/MAX(date) in get_database_stats become index lookups
+    CREATE INDEX IF NOT EXISTS idx_prices_date ON stock_prices(date);
+    
+    -- Row counters so stats don't scan whole tables
+    CREATE TABLE IF NOT EXISTS row_counts (
+        table_name TEXT PRIMARY KEY,
+        n INTEGER NOT NULL
+    );
+''' + ''.join(ROW_COUNT_SQL.format(table=table) for table in COUNTED_TABLES + ['trades']) \
+  + ''.join(ROW_COUNT_TRIGGERS_SQL.format(table=table) for table in COUNTED_TABLES)
+
+# Keys callers may attach to a quote that don't belong in stocks.data
+NON_PAYLOAD_KEYS = {'historical'}
+
+# Live managers, flushed by one exit handler without keeping them alive
+_managers = weakref.WeakSet()
+
+@atexit.register
+def _flush_all_logs():
+    """Write any API usage rows still buffered when the process exits"""
+    for manager in list(_managers):
+        manager._flush_logs()
 
 class DatabaseManager:
     def __init__(self, db_path='data/portfolio.db'):
@@ -19,257 +180,391 @@ class DatabaseManager:
         # Ensure data directory exists
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
+        # Per-symbol Parquet files holding full price history
+        self.prices_dir = os.path.join(os.path.dirname(db_path), 'prices')
+        self._parquet_lock = threading.Lock()
+        
+        # One long-lived connection shared by all threads, opened lazily by _connection.
+        # Per-thread connections don't survive here: Flask's dev server and gevent
+        # workers both run each request on a fresh thread/greenlet.
+        self._conn = None
+        self._conn_lock = threading.RLock()
+        
+        # API usage rows are buffered and written in batches by _flush_logs
+        self._log_buffer = deque()
+        self._log_lock = threading.Lock()
+        self._log_flush_threshold = 200
+        self._log_flush_interval = 30  # seconds
+        self._last_log_flush = time.monotonic()
+        _managers.add(self)
+        
+    @contextmanager
+    def _connection(self):
+        """Hold the shared tuned connection for one operation; transactions are explicit (autocommit otherwise)"""
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+                self._conn.executescript(CONNECTION_PRAGMAS)
+            yield self._conn
+        
+    @contextmanager
+    def _transaction(self):
+        """Run a block in one transaction, rolling back so the shared connection stays usable"""
+        with self._connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+    def close(self):
+        """Flush buffered API usage rows and close the shared connection"""
+        self._flush_logs()
+        
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        
     def initialize_database(self):
         """Initialize database with required tables"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Stocks table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stocks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol TEXT UNIQUE NOT NULL,
-                    name TEXT,
-                    sector TEXT,
-                    industry TEXT,
-                    country TEXT,
-                    exchange TEXT,
-                    currency TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Stock prices table (historical data)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stock_prices (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol TEXT NOT NULL,
-                    date DATE NOT NULL,
-                    open_price REAL,
-                    high_price REAL,
-                    low_price REAL,
-                    close_price REAL,
-                    volume INTEGER,
-                    source TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(symbol, date)
-                )
-            ''')
-            
-            # Portfolio performance tracking
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS portfolio_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    snapshot_date DATE NOT NULL,
-                    total_stocks INTEGER,
-                    total_market_cap REAL,
-                    avg_change REAL,
-                    success_rate REAL,
-                    data_coverage_percent REAL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        with self._connection() as conn:
+            try:
+                # Databases created before the clustered layout still have a rowid id column
+                price_columns = {row[1] for row in conn.execute('PRAGMA table_info(stock_prices)')}
+                if 'id' in price_columns:
+                    self._migrate_stock_prices(conn)
+                
+                # ...and stocks with typed columns instead of the JSON payload
+                stock_columns = {row[1] for row in conn.execute('PRAGMA table_xinfo(stocks)')}
+                if stock_columns and 'data' not in stock_columns:
+                    self._migrate_stocks(conn)
+                
+                # The whole schema is created atomically in one script
+                conn.executescript(f'BEGIN;\n{SCHEMA_SQL}\nCOMMIT;')
+                
+                # import_trades_data replaces the trades table with the CSV layout,
+                # so only index it while it still has the columns defined in SCHEMA_SQL
+                trade_columns = {row[1] for row in conn.execute('PRAGMA table_info(trades)')}
+                if {'symbol', 'trade_date'} <= trade_columns:
+                    conn.execute('''
+                        CREATE INDEX IF NOT EXISTS idx_trades_symbol_date
+                        ON trades(symbol, trade_date)
+                    ''')
+                
+                self.logger.info("Database initialized successfully")
             
-            # API usage tracking
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS api_usage (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    api_source TEXT NOT NULL,
-                    symbol TEXT,
-                    request_date DATE NOT NULL,
-                    success BOOLEAN,
-                    response_time REAL,
-                    error_message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                self.logger.error(f"Error initializing database: {str(e)}")
+                raise e
+    
+    def _migrate_stock_prices(self, conn):
+        """Rebuild a legacy stock_prices table as WITHOUT ROWID keyed on (symbol, date)"""
+        with self._transaction():
+            conn.execute('ALTER TABLE stock_prices RENAME TO stock_prices_legacy')
+            conn.execute(STOCK_PRICES_SQL)
+            conn.execute('''
+                INSERT INTO stock_prices
+                SELECT symbol, date, open_price, high_price, low_price, close_price, volume, source, created_at
+                FROM stock_prices_legacy
             ''')
+            conn.execute('DROP TABLE stock_prices_legacy')
             
-            # Trading data
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS trades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol TEXT,
-                    trade_date DATE,
-                    trade_type TEXT,
-                    quantity INTEGER,
-                    price REAL,
-                    volume INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+        self.logger.info("Migrated stock_prices to WITHOUT ROWID layout")
+    
+    def _migrate_stocks(self, conn):
+        """Rebuild a legacy stocks table, folding its typed columns into the JSON payload"""
+        with self._transaction():
+            conn.execute('ALTER TABLE stocks RENAME TO stocks_legacy')
+            conn.execute(STOCKS_SQL)
+            conn.execute('''
+                INSERT INTO stocks (id, symbol, data, created_at, updated_at)
+                SELECT id, symbol,
+                       json_object('name', name, 'sector', sector, 'industry', industry,
+                                   'country', country, 'exchange', exchange, 'currency', currency),
+                       created_at, updated_at
+                FROM stocks_legacy
             ''')
+            conn.execute('DROP TABLE stocks_legacy')
             
-            conn.commit()
-            conn.close()
-            
-            self.logger.info("Database initialized successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Error initializing database: {str(e)}")
-            raise e
+        self.logger.info("Migrated stocks to JSON payload layout")
     
     def store_stock_data(self, symbol, stock_data):
         """Store stock data in database"""
+        self.store_stock_data_bulk({symbol: stock_data})
+    
+    def store_stock_data_bulk(self, stocks_dict):
+        """Store stock data for many symbols ({symbol: stock_data}) in one transaction"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Insert or update stock info
-            cursor.execute('''
-                INSERT OR REPLACE INTO stocks 
-                (symbol, name, sector, industry, country, exchange, currency, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                symbol,
-                stock_data.get('name', ''),
-                stock_data.get('sector', ''),
-                stock_data.get('industry', ''),
-                stock_data.get('country', ''),
-                stock_data.get('exchange', ''),
-                stock_data.get('currency', 'USD'),
-                datetime.now()
-            ))
-            
-            # Store current price data
-            cursor.execute('''
-                INSERT OR REPLACE INTO stock_prices 
-                (symbol, date, open_price, high_price, low_price, close_price, volume, source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                symbol,
-                datetime.now().date(),
-                stock_data.get('open', 0),
-                stock_data.get('high', 0),
-                stock_data.get('low', 0),
-                stock_data.get('price', 0),
-                stock_data.get('volume', 0),
-                stock_data.get('source', 'unknown')
-            ))
+            # Format the timestamps once; sqlite3 would otherwise adapt the
+            # datetime objects row by row (to these same strings)
+            now = datetime.now()
+            updated_at = now.isoformat(' ')
+            today = now.date().isoformat()
+            
+            stock_rows = [
+                (
+                    symbol,
+                    # orjson writes NaN as null (JSON1 rejects a bare NaN) and handles NumPy scalars
+                    orjson.dumps({key: value for key, value in stock_data.items() if key not in NON_PAYLOAD_KEYS},
+                                 default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode(),
+                    updated_at
+                )
+                for symbol, stock_data in stocks_dict.items()
+            ]
             
-            conn.commit()
-            conn.close()
+            price_rows = [
+                (
+                    symbol,
+                    today,
+                    stock_data.get('open', 0),
+                    stock_data.get('high', 0),
+                    stock_data.get('low', 0),
+                    stock_data.get('price', 0),
+                    stock_data.get('volume', 0),
+                    stock_data.get('source', 'unknown')
+                )
+                for symbol, stock_data in stocks_dict.items()
+            ]
+            
+            with self._transaction() as conn:
+                # Insert new stocks; merge into existing ones so a partial quote
+                # (e.g. a bulk price update) keeps the stored name and metadata
+                conn.executemany('''
+                    INSERT INTO stocks (symbol, data, updated_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(symbol) DO UPDATE SET
+                        data = json_patch(coalesce(stocks.data, '{}'), excluded.data),
+                        updated_at = excluded.updated_at
+                ''', stock_rows)
+                
+                # Store current price data
+                conn.executemany('''
+                    INSERT OR REPLACE INTO stock_prices 
+                    (symbol, date, open_price, high_price, low_price, close_price, volume, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', price_rows)
             
         except Exception as e:
-            self.logger.error(f"Error storing stock data for {symbol}: {str(e)}")
+            self.logger.error(f"Error storing stock data for {', '.join(stocks_dict)}: {str(e)}")
     
     def store_historical_data(self, symbol, historical_data):
-        """Store historical price data"""
+        """Store historical price data given as a list of dicts"""
+        self.store_historical_df(symbol, pd.DataFrame(historical_data))
+    
+    def store_historical_df(self, symbol, df):
+        """Store historical price data from a DataFrame with date/open/high/low/close/volume columns"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for data_point in historical_data:
-                cursor.execute('''
+            df = df.reindex(columns=HISTORY_COLUMNS)
+            if pd.api.types.is_datetime64_any_dtype(df['date']):
+                df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+                
+            prices = df[['open', 'high', 'low', 'close']].fillna(0).astype('float64')
+            
+            # Column lists give plain Python values for sqlite3 without per-row dict lookups
+            rows = zip(
+                [symbol] * len(df),
+                df['date'].tolist(),
+                prices['open'].tolist(),
+                prices['high'].tolist(),
+                prices['low'].tolist(),
+                prices['close'].tolist(),
+                df['volume'].fillna(0).astype('int64').tolist(),
+                ['historical'] * len(df)
+            )
+            
+            # One transaction for the whole batch instead of one per row
+            with self._transaction() as conn:
+                conn.executemany('''
                     INSERT OR REPLACE INTO stock_prices 
                     (symbol, date, open_price, high_price, low_price, close_price, volume, source)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    symbol,
-                    data_point.get('date'),
-                    data_point.get('open', 0),
-                    data_point.get('high', 0),
-                    data_point.get('low', 0),
-                    data_point.get('close', 0),
-                    data_point.get('volume', 0),
-                    'historical'
-                ))
+                ''', rows)
+
+            # Mirror the history into the Parquet side store; get_stock_history merges in
+            # any newer daily quotes that were written to SQLite only
+            if PARQUET_AVAILABLE:
+                self.store_historical_data_parquet(symbol, df)
+
+        except Exception as e:
+            self.logger.error(f"Error storing historical data for {symbol}: {str(e)}")
+    
+    def _parquet_path(self, symbol):
+        """Parquet file for a symbol, with path-unsafe characters replaced"""
+        return os.path.join(self.prices_dir, re.sub(r'[^A-Za-z0-9._-]', '_', symbol) + '.parquet')
+    
+    @contextmanager
+    def _locked_parquet(self, path):
+        """Serialize read-modify-write of a Parquet file across threads and worker processes"""
+        with self._parquet_lock, open(path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                # Released when the lock file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+    
+    def store_historical_data_parquet(self, symbol, df):
+        """Merge historical prices into the symbol's zstd-compressed Parquet file"""
+        if not PARQUET_AVAILABLE:
+            return False
             
-            conn.commit()
-            conn.close()
+        try:
+            path = self._parquet_path(symbol)
+            os.makedirs(self.prices_dir, exist_ok=True)
+            
+            with self._locked_parquet(path):
+                if os.path.exists(path):
+                    existing = pd.read_parquet(path, columns=HISTORY_COLUMNS)
+                else:
+                    # A new file starts from everything SQLite already holds for the symbol
+                    existing = self._query_stock_history(symbol, -1)
+                    
+                df = pd.concat([existing, df.reindex(columns=HISTORY_COLUMNS)])
+                
+                # Same defaults and types as the SQLite rows
+                df['date'] = pd.to_datetime(df['date'])
+                df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].fillna(0).astype('float64')
+                df['volume'] = df['volume'].fillna(0).astype('int64')
+                df = df.drop_duplicates('date', keep='last').sort_values('date')
+                
+                # Readers only ever see a complete file
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                df.to_parquet(tmp_path, compression='zstd', index=False)
+                os.replace(tmp_path, path)
+                
+            return True
             
         except Exception as e:
-            self.logger.error(f"Error storing historical data for {symbol}: {str(e)}")
+            self.logger.error(f"Error storing Parquet history for {symbol}: {str(e)}")
+            return False
+    
+    def _query_stock_history(self, symbol, days, after=''):
+        """Newest-first price rows from SQLite, optionally only those dated after a day"""
+        query = '''
+            SELECT date,
+                   open_price AS open,
+                   high_price AS high,
+                   low_price AS low,
+                   close_price AS close,
+                   volume
+            FROM stock_prices 
+            WHERE symbol = ? AND date > ?
+            ORDER BY date DESC 
+            LIMIT ?
+        '''
+        
+        with self._connection() as conn:
+            return pd.read_sql_query(query, conn, params=(symbol, after, days), parse_dates=['date'])
     
     def get_stock_history(self, symbol, days=365):
-        """Get historical data for a stock"""
+        """Get historical data for a stock as a DataFrame (newest first)"""
+        path = self._parquet_path(symbol)
+        if PARQUET_AVAILABLE and os.path.exists(path):
+            try:
+                df = pd.read_parquet(path, columns=HISTORY_COLUMNS).iloc[::-1]
+                
+                # Only trust the file if it reaches back as far as SQLite does
+                with self._connection() as conn:
+                    sqlite_start, = conn.execute('SELECT MIN(date) FROM stock_prices WHERE symbol = ?',
+                                                 (symbol,)).fetchone()
+                    
+                if not df.empty and (sqlite_start is None or
+                                     df['date'].iloc[-1].strftime('%Y-%m-%d') <= sqlite_start):
+                    # Daily quotes from store_stock_data_bulk only go to SQLite, so
+                    # add any rows newer than the Parquet tail
+                    newer = self._query_stock_history(symbol, days, after=df['date'].iloc[0].strftime('%Y-%m-%d'))
+                    if not newer.empty:
+                        df = pd.concat([newer, df])
+                        
+                    return df.iloc[:days].reset_index(drop=True)
+            except Exception as e:
+                self.logger.error(f"Error reading Parquet history for {symbol}: {str(e)}")
+                
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            query = '''
-                SELECT date, open_price, high_price, low_price, close_price, volume
-                FROM stock_prices 
-                WHERE symbol = ? 
-                ORDER BY date DESC 
-                LIMIT ?
-            '''
-            
-            df = pd.read_sql_query(query, conn, params=(symbol, days))
-            conn.close()
-            
-            return df.to_dict('records')
+            return self._query_stock_history(symbol, days)
             
         except Exception as e:
             self.logger.error(f"Error getting stock history for {symbol}: {str(e)}")
-            return []
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
     
     def store_portfolio_snapshot(self, performance_data):
         """Store portfolio performance snapshot"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO portfolio_snapshots 
-                (snapshot_date, total_stocks, total_market_cap, avg_change, success_rate, data_coverage_percent)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                datetime.now().date(),
-                performance_data.get('total_stocks', 0),
-                performance_data.get('total_market_cap', 0),
-                performance_data.get('avg_change', 0),
-                90.0,  # Target success rate
-                95.0   # Data coverage percentage
-            ))
+            today = datetime.now().date().isoformat()
             
-            conn.commit()
-            conn.close()
+            with self._connection() as conn:
+                conn.execute('''
+                    INSERT INTO portfolio_snapshots 
+                    (snapshot_date, total_stocks, total_market_cap, avg_change, success_rate, data_coverage_percent)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    today,
+                    performance_data.get('total_stocks', 0),
+                    performance_data.get('total_market_cap', 0),
+                    performance_data.get('avg_change', 0),
+                    90.0,  # Target success rate
+                    95.0   # Data coverage percentage
+                ))
             
         except Exception as e:
             self.logger.error(f"Error storing portfolio snapshot: {str(e)}")
     
     def log_api_usage(self, api_source, symbol, success, response_time=None, error_message=None):
-        """Log API usage for monitoring"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+        """Log API usage for monitoring; rows are buffered and written in batches"""
+        # Stamp the date now; a quiet buffer can sit unflushed past midnight
+        row = (api_source, symbol, datetime.now().date().isoformat(), success, response_time, error_message)
+        
+        with self._log_lock:
+            self._log_buffer.append(row)
+            should_flush = (len(self._log_buffer) >= self._log_flush_threshold or
+                            time.monotonic() - self._last_log_flush >= self._log_flush_interval)
             
-            cursor.execute('''
-                INSERT INTO api_usage 
-                (api_source, symbol, request_date, success, response_time, error_message)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                api_source,
-                symbol,
-                datetime.now().date(),
-                success,
-                response_time,
-                error_message
-            ))
+        if should_flush:
+            self._flush_logs()
+    
+    def _flush_logs(self):
+        """Write buffered API usage rows in one transaction"""
+        with self._log_lock:
+            if not self._log_buffer:
+                return
+            buffered = list(self._log_buffer)
+            self._log_buffer.clear()
+            self._last_log_flush = time.monotonic()
             
-            conn.commit()
-            conn.close()
+        try:
+            with self._transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO api_usage 
+                    (api_source, symbol, request_date, success, response_time, error_message)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', buffered)
             
         except Exception as e:
             self.logger.error(f"Error logging API usage: {str(e)}")
     
     def get_api_usage_stats(self, days=30):
         """Get API usage statistics"""
+        self._flush_logs()
+        
         try:
-            conn = sqlite3.connect(self.db_path)
+            cutoff = (datetime.now().date() - timedelta(days=days)).isoformat()
             
+            # Bound parameter keeps the statement text constant so SQLite can reuse its plan
             query = '''
                 SELECT api_source, 
                        COUNT(*) as total_requests,
-                       SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_requests,
+                       SUM(success) as successful_requests,
                        AVG(response_time) as avg_response_time
                 FROM api_usage 
-                WHERE request_date >= date('now', '-{} days')
+                WHERE request_date >= ?
                 GROUP BY api_source
-            '''.format(days)
+            '''
             
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            with self._connection() as conn:
+                df = pd.read_sql_query(query, conn, params=(cutoff,))
             
             return df.to_dict('records')
             
@@ -280,13 +575,26 @@ class DatabaseManager:
     def import_trades_data(self, trades_df):
         """Import trading data from CSV"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            
             # Map CSV columns to database columns
             if not trades_df.empty:
-                trades_df.to_sql('trades', conn, if_exists='replace', index=False)
+                columns = ', '.join('"{}"'.format(str(col).replace('"', '""')) for col in trades_df.columns)
+                placeholders = ', '.join('?' * len(trades_df.columns))
+                rows = trades_df.astype(object).where(trades_df.notna(), None).itertuples(index=False, name=None)
+                
+                # to_sql commits after creating the table, so drop, create and load here
+                # in one transaction, with no indexes to maintain per row
+                with self._transaction() as conn:
+                    conn.execute('DROP TABLE IF EXISTS trades')
+                    conn.execute(pd.io.sql.get_schema(trades_df, 'trades'))
+                    conn.executemany(f'INSERT INTO trades ({columns}) VALUES ({placeholders})', rows)
+                    conn.execute('INSERT OR REPLACE INTO row_counts (table_name, n) VALUES (?, ?)',
+                                 ('trades', len(trades_df)))
+                    
+                # Build indexes once the data is in place
+                if {'Code', 'Date'} <= set(trades_df.columns):
+                    with self._connection() as conn:
+                        conn.execute('CREATE INDEX IF NOT EXISTS idx_trades_code_date ON trades(Code, Date)')
                 
-            conn.close()
             self.logger.info(f"Imported {len(trades_df)} trade records")
             
         except Exception as e:
@@ -294,28 +602,27 @@ class DatabaseManager:
     
     def get_database_stats(self):
         """Get database statistics"""
+        self._flush_logs()
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             stats = {}
             
-            # Count records in each table
-            tables = ['stocks', 'stock_prices', 'portfolio_snapshots', 'api_usage', 'trades']
-            
-            for table in tables:
-                cursor.execute(f'SELECT COUNT(*) FROM {table}')
-                stats[f'{table}_count'] = cursor.fetchone()[0]
-            
-            # Get date ranges
-            cursor.execute('SELECT MIN(date), MAX(date) FROM stock_prices')
-            price_range = cursor.fetchone()
-            stats['price_data_range'] = {
-                'start': price_range[0],
-                'end': price_range[1]
-            }
-            
-            conn.close()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                # Record counts come from the trigger-maintained row_counts table
+                counts = dict(cursor.execute('SELECT table_name, n FROM row_counts'))
+                
+                for table in COUNTED_TABLES + ['trades']:
+                    stats[f'{table}_count'] = counts.get(table, 0)
+                
+                # Get date ranges
+                cursor.execute('SELECT (SELECT MIN(date) FROM stock_prices), (SELECT MAX(date) FROM stock_prices)')
+                price_range = cursor.fetchone()
+                stats['price_data_range'] = {
+                    'start': price_range[0],
+                    'end': price_range[1]
+                }
             
             return stats
             
@@ -0,0 +1,31 @@
+"""
+Numeric Kernels
+Loops that NumPy cannot vectorize, JIT-compiled with Numba when it is installed
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Run the plain Python function when Numba is unavailable"""
+        def decorator(func):
+            return func
+        return decorator
+
+@njit(cache=True)
+def random_walk(deltas, start, floor):
+    """Cumulative walk over deltas, clamped to floor at every step"""
+    prices = np.empty(len(deltas), dtype=np.float64)
+    price = start
+    for i in range(len(deltas)):
+        price = max(price + deltas[i], floor)
+        prices[i] = price
+    return prices
+
+# Compile at import so the first request doesn't pay the JIT cost
+random_walk(np.zeros(1), 100.0, 1.0)
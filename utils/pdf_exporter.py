@@ -4,7 +4,9 @@ PDF Export Functionality
 Generate comprehensive portfolio reports
 """
 
+import heapq
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
@@ -17,34 +19,116 @@ from reportlab.graphics.charts.piecharts import Pie
 import pandas as pd
 import logging
 
+from .database_manager import DatabaseManager
+
+# Table styles are immutable once built, so share them across reports
+PORTFOLIO_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+SECTOR_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+TOP_PERFORMERS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8)
+])
+
+DETAILS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+HISTORY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+def _build_stock_detail_report(task):
+    """Process pool worker: load one stock's history and render its report"""
+    stock_data, db_path, output_dir = task
+    
+    # Each worker process opens its own SQLite connection
+    db_manager = DatabaseManager(db_path)
+    try:
+        exporter = PDFExporter()
+        exporter.output_dir = output_dir
+        
+        historical_data = db_manager.get_stock_history(stock_data.get('symbol'), days=5 * 365)
+        return exporter.generate_stock_detail_report(stock_data, historical_data)
+    except Exception:
+        # generate_stock_detail_report has already logged the error
+        return None
+    finally:
+        db_manager.close()
+
 class PDFExporter:
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        textColor=colors.darkblue
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=12,
+        textColor=colors.darkgreen
+    )
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.styles = getSampleStyleSheet()
         self.output_dir = 'reports'
         
         # Create reports directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
-        
-        # Custom styles
-        self.title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            textColor=colors.darkblue
-        )
-        
-        self.heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=self.styles['Heading2'],
-            fontSize=16,
-            spaceAfter=12,
-            textColor=colors.darkgreen
-        )
     
-    def generate_portfolio_report(self, stocks_data, performance_data, sector_data):
-        """Generate comprehensive portfolio PDF report"""
+    def generate_portfolio_report(self, stocks_data, performance_data, sector_data, top_performers=None):
+        """Generate comprehensive portfolio PDF report
+        
+        sector_data may be a dict keyed by sector or a DataFrame of sector aggregates;
+        top_performers is an optional precomputed DataFrame of the top stocks.
+        """
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"portfolio_report_{timestamp}.pdf"
@@ -95,16 +179,7 @@ class PDFExporter:
             ]
             
             portfolio_table = Table(portfolio_data)
-            portfolio_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
+            portfolio_table.setStyle(PORTFOLIO_TABLE_STYLE)
             
             story.append(portfolio_table)
             story.append(Spacer(1, 20))
@@ -114,25 +189,24 @@ class PDFExporter:
             
             sector_table_data = [['Sector', 'Count', 'Avg Market Cap', 'Avg Change']]
             
-            for sector, data in sector_data.items():
+            if isinstance(sector_data, pd.DataFrame):
+                sector_rows = sector_data[['sector', 'count', 'avg_market_cap', 'avg_change']].itertuples(index=False, name=None)
+            else:
+                sector_rows = (
+                    (sector, data['count'], data.get('avg_market_cap', 0), data.get('avg_change', 0))
+                    for sector, data in sector_data.items()
+                )
+            
+            for sector, count, avg_market_cap, avg_change in sector_rows:
                 sector_table_data.append([
                     sector,
-                    str(data['count']),
-                    f"${data.get('avg_market_cap', 0):,.0f}",
-                    f"${data.get('avg_change', 0):.2f}"
+                    str(count),
+                    f"${avg_market_cap:,.0f}",
+                    f"${avg_change:.2f}"
                 ])
             
             sector_table = Table(sector_table_data)
-            sector_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
+            sector_table.setStyle(SECTOR_TABLE_STYLE)
             
             story.append(sector_table)
             story.append(Spacer(1, 20))
@@ -140,32 +214,29 @@ class PDFExporter:
             # Top Performers
             story.append(Paragraph("Top Performing Stocks", self.heading_style))
             
-            # Sort stocks by change and get top 10
-            sorted_stocks = sorted(stocks_data, key=lambda x: x.get('change', 0), reverse=True)[:10]
+            if top_performers is not None:
+                sorted_stocks = top_performers.to_dict('records')
+            else:
+                # Top 10 stocks by change without sorting the whole list
+                sorted_stocks = heapq.nlargest(10, stocks_data, key=lambda x: x.get('change', 0))
             
             top_performers_data = [['Symbol', 'Name', 'Price', 'Change', 'Sector']]
             
             for stock in sorted_stocks:
+                name = stock.get('name') or 'N/A'
+                if len(name) > 30:
+                    name = name[:30] + '...'
+                    
                 top_performers_data.append([
                     stock.get('symbol', 'N/A'),
-                    stock.get('name', 'N/A')[:30] + '...' if len(stock.get('name', '')) > 30 else stock.get('name', 'N/A'),
-                    f"${stock.get('price', 0):.2f}",
-                    f"${stock.get('change', 0):.2f}",
-                    stock.get('sector', 'Unknown')[:15]
+                    name,
+                    f"${stock.get('price') or 0:.2f}",
+                    f"${stock.get('change') or 0:.2f}",
+                    (stock.get('sector') or 'Unknown')[:15]
                 ])
             
             top_performers_table = Table(top_performers_data)
-            top_performers_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8)
-            ]))
+            top_performers_table.setStyle(TOP_PERFORMERS_TABLE_STYLE)
             
             story.append(top_performers_table)
             story.append(Spacer(1, 20))
@@ -239,46 +310,29 @@ class PDFExporter:
             ]
             
             details_table = Table(stock_details)
-            details_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
+            details_table.setStyle(DETAILS_TABLE_STYLE)
             
             story.append(details_table)
             story.append(Spacer(1, 20))
             
-            # Historical data summary
-            if historical_data:
+            # Historical data summary (a DataFrame or a list of records)
+            if historical_data is not None and len(historical_data) > 0:
                 story.append(Paragraph("Historical Data Summary (5 Years)", self.heading_style))
                 
-                df = pd.DataFrame(historical_data)
+                df = historical_data if isinstance(historical_data, pd.DataFrame) else pd.DataFrame(historical_data)
                 if not df.empty and 'close' in df.columns:
+                    stats = df['close'].astype('float64').agg(['max', 'min', 'mean', 'std'])
                     hist_summary = [
                         ['Metric', 'Value'],
                         ['Data Points', str(len(df))],
-                        ['Highest Price', f"${df['close'].max():.2f}"],
-                        ['Lowest Price', f"${df['close'].min():.2f}"],
-                        ['Average Price', f"${df['close'].mean():.2f}"],
-                        ['Price Volatility (Std)', f"${df['close'].std():.2f}"]
+                        ['Highest Price', f"${stats['max']:.2f}"],
+                        ['Lowest Price', f"${stats['min']:.2f}"],
+                        ['Average Price', f"${stats['mean']:.2f}"],
+                        ['Price Volatility (Std)', f"${stats['std']:.2f}"]
                     ]
                     
                     hist_table = Table(hist_summary)
-                    hist_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 12),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                    ]))
+                    hist_table.setStyle(HISTORY_TABLE_STYLE)
                     
                     story.append(hist_table)
             
@@ -291,3 +345,15 @@ class PDFExporter:
         except Exception as e:
             self.logger.error(f"Error generating stock detail PDF: {str(e)}")
             raise e
+    
+    def generate_stock_detail_reports_bulk(self, stocks, db_path='data/portfolio.db', max_workers=None):
+        """Generate detail reports for many stocks in parallel, one process per CPU
+        
+        Returns the report paths in input order, with None for any that failed.
+        """
+        tasks = [(stock_data, db_path, self.output_dir) for stock_data in stocks]
+        if not tasks:
+            return []
+            
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_build_stock_detail_report, tasks))